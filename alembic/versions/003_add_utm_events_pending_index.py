@@ -0,0 +1,38 @@
+"""Add partial index for pending Metrika events
+
+Revision ID: 003_utm_events_pending_index
+Revises: 002_performance_indices
+Create Date: 2026-10-16
+
+This migration adds a partial index covering only UTM events that still
+have to be uploaded to Yandex Metrika:
+- UTMEvent: index on id WHERE sent_to_metrika = false AND metrika_client_id IS NOT NULL
+
+Expected performance improvements:
+- Periodic Metrika upload no longer scans the whole (ever-growing) utm_events table
+- Pending events are returned already ordered, without a sort step
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '003_utm_events_pending_index'
+down_revision = '002_performance_indices'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add partial index for pending Metrika events"""
+    op.create_index(
+        'idx_utm_events_pending',
+        'utm_events',
+        ['id'],
+        postgresql_where=sa.text('sent_to_metrika = false AND metrika_client_id IS NOT NULL')
+    )
+
+
+def downgrade():
+    """Remove partial index for pending Metrika events"""
+    op.drop_index('idx_utm_events_pending', table_name='utm_events')
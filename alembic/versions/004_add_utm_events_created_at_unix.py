@@ -0,0 +1,36 @@
+"""Add UNIX timestamp column to UTM events
+
+Revision ID: 004_utm_events_created_at_unix
+Revises: 003_utm_events_pending_index
+Create Date: 2026-10-16
+
+This migration stores event creation time as a UNIX epoch next to created_at:
+- UTMEvent: created_at_unix BIGINT, backfilled from created_at (stored as UTC)
+
+Expected performance improvements:
+- Metrika upload uses the stored epoch instead of converting a datetime per event
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '004_utm_events_created_at_unix'
+down_revision = '003_utm_events_pending_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add and backfill created_at_unix"""
+    op.add_column('utm_events', sa.Column('created_at_unix', sa.BigInteger(), nullable=True))
+    op.execute(
+        "UPDATE utm_events "
+        "SET created_at_unix = EXTRACT(EPOCH FROM created_at)::bigint "
+        "WHERE created_at_unix IS NULL"
+    )
+
+
+def downgrade():
+    """Remove created_at_unix"""
+    op.drop_column('utm_events', 'created_at_unix')
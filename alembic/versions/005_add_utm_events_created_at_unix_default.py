@@ -0,0 +1,42 @@
+"""Default UTM event UNIX timestamp on the server
+
+Revision ID: 005_utm_events_unix_default
+Revises: 004_utm_events_created_at_unix
+Create Date: 2026-10-16
+
+This migration makes sure created_at_unix is always populated:
+- UTMEvent: backfill created_at_unix rows written after migration 004
+  by processes that don't know the column yet
+- UTMEvent: server default EXTRACT(EPOCH FROM now()) for inserts that omit it
+
+Expected performance improvements:
+- Metrika upload rarely needs the created_at conversion fallback
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '005_utm_events_unix_default'
+down_revision = '004_utm_events_created_at_unix'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Backfill and add server default for created_at_unix"""
+    op.execute(
+        "UPDATE utm_events "
+        "SET created_at_unix = EXTRACT(EPOCH FROM created_at)::bigint "
+        "WHERE created_at_unix IS NULL"
+    )
+    op.alter_column(
+        'utm_events',
+        'created_at_unix',
+        server_default=sa.text("EXTRACT(EPOCH FROM now())::bigint")
+    )
+
+
+def downgrade():
+    """Remove server default for created_at_unix"""
+    op.alter_column('utm_events', 'created_at_unix', server_default=None)
@@ -11,17 +11,13 @@ from alembic import command
 from app.config import settings
 from app.database import init_db
 from app.handlers import user, admin, payment, support, batch_processing, style_management, custom_styles
-from app.services.yandex_metrika import periodic_metrika_upload
+from app.services.yandex_metrika import metrika_service, periodic_metrika_upload, periodic_event_flush
 from app.middlewares import DbSessionMiddleware
+from app.utils.logging_config import setup_queue_logging
 
 # Setup logging
 def setup_logging():
-    logging.basicConfig(
-        level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        stream=sys.stdout,
-        force=True
-    )
+    setup_queue_logging(level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -108,6 +104,9 @@ async def main():
     dp.include_router(payment.router)
     dp.include_router(support.router)
 
+    # Start background task for bulk inserting tracked events
+    event_flush_task = asyncio.create_task(periodic_event_flush(db.get_session))
+
     # Start background task for periodic Metrika upload
     metrika_upload_task = None
     if settings.is_metrika_enabled:
@@ -137,6 +136,12 @@ async def main():
                 await metrika_upload_task
             except asyncio.CancelledError:
                 logger.info("Metrika upload task cancelled")
+        event_flush_task.cancel()
+        try:
+            await event_flush_task
+        except asyncio.CancelledError:
+            pass
+        await metrika_service.aclose()
         await bot.session.close()
 
 
@@ -147,6 +152,13 @@ if __name__ == "__main__":
         
         # Restore logging configuration after migrations (Alembic resets it)
         setup_logging()
+
+        # Use libuv-based event loop where available (not supported on Windows)
+        try:
+            import uvloop
+            uvloop.install()
+        except ImportError:
+            logger.info("uvloop not installed, using default asyncio event loop")
         
         # Start the bot
         asyncio.run(main())
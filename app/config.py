@@ -66,6 +66,7 @@ class Settings(BaseSettings):
     METRIKA_GOAL_FIRST_PHOTOSHOOT: str = "first_photoshoot"
     METRIKA_GOAL_PURCHASE: str = "purchase"
     METRIKA_UPLOAD_INTERVAL: int = 3600
+    TRACK_EVENTS_LOCALLY: bool = True  # Store non-purchase events even when Metrika is disabled
     
     # Referral Program
     REFERRAL_REWARD_START: int = 1  # photoshoots rewarded when referral clicks start
@@ -15,6 +15,7 @@ class Database:
             pool_timeout=30,  # Wait time for connection (seconds)
             pool_recycle=3600,  # Recycle connections every hour (prevents stale connections)
             pool_pre_ping=True,  # Check connection health before use
+            query_cache_size=1200,  # Compiled statement cache (default 500)
             echo=False
         )
         self.session_maker = async_sessionmaker(
@@ -145,17 +145,21 @@ async def create_style_preset(
     session: AsyncSession,
     user_id: int,
     name: str,
-    style_data: dict
+    style_data: dict,
+    commit: bool = True
 ) -> StylePreset:
-    """Create saved style"""
+    """Create saved style (with commit=False the preset is only flushed)"""
     preset = StylePreset(
         user_id=user_id,
         name=name,
         style_data=style_data
     )
     session.add(preset)
-    await session.commit()
-    await session.refresh(preset)
+    if commit:
+        await session.commit()
+        await session.refresh(preset)
+    else:
+        await session.flush()
     return preset
 
 
@@ -173,6 +177,23 @@ async def get_user_style_presets(
     return result.scalars().all()
 
 
+async def get_presets_for_users(
+    session: AsyncSession,
+    user_ids: List[int],
+    active_only: bool = True
+) -> List[StylePreset]:
+    """Get style presets for several users in a single query"""
+    if not user_ids:
+        return []
+
+    query = select(StylePreset).where(StylePreset.user_id.in_(user_ids))
+    if active_only:
+        query = query.where(StylePreset.is_active == True)
+    query = query.order_by(StylePreset.user_id, StylePreset.created_at.desc())
+    result = await session.execute(query)
+    return result.scalars().all()
+
+
 async def get_style_preset_by_id(
     session: AsyncSession,
     preset_id: int,
@@ -188,6 +209,26 @@ async def get_style_preset_by_id(
     return result.scalar_one_or_none()
 
 
+async def get_preset_style_fields(
+    session: AsyncSession,
+    preset_id: int,
+    user_id: int
+) -> Optional[tuple]:
+    """Get (name, product_name, aspect_ratio, prompts) of a style preset without loading the full row"""
+    query = select(
+        StylePreset.name,
+        StylePreset.style_data["product_name"].astext,
+        StylePreset.style_data["aspect_ratio"].astext,
+        StylePreset.style_data["prompts"]
+    ).where(
+        StylePreset.id == preset_id,
+        StylePreset.user_id == user_id,
+        StylePreset.is_active == True
+    )
+    result = await session.execute(query)
+    return result.one_or_none()
+
+
 async def update_style_preset(
     session: AsyncSession,
     preset_id: int,
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, Numeric, String, Text, Index, JSON
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, Numeric, String, Text, Index, JSON, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from typing import Optional, List
@@ -207,6 +207,12 @@ class UTMEvent(Base):
         Index('idx_utm_events_user_type', 'user_id', 'event_type'),
         Index('idx_utm_events_created', 'created_at'),
         Index('idx_utm_events_sent', 'sent_to_metrika'),
+        # Pending Metrika uploads, scanned in id order by upload_pending_events
+        Index(
+            'idx_utm_events_pending',
+            'id',
+            postgresql_where=text('sent_to_metrika = false AND metrika_client_id IS NOT NULL')
+        ),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -220,6 +226,7 @@ class UTMEvent(Base):
     sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     metrika_upload_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    created_at_unix: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, server_default=text("EXTRACT(EPOCH FROM now())::bigint"))  # Same moment as UNIX epoch for Metrika uploads
 
     # Relationships
     user: Mapped["User"] = relationship("User", back_populates="utm_events")
@@ -227,7 +227,7 @@ async def create_payment_with_contact(message: Message, state: FSMContext, sessi
             yookassa = YookassaService()
             
             logger.info(f"User {message.from_user.id} | Creating payment via YooKassa API...")
-            payment_info = yookassa.create_payment(
+            payment_info = await yookassa.create_payment(
                 amount=float(package.price_rub),
                 description=f"Покупка пакета: {package.name}",
                 order_id=order_id_str,
@@ -372,7 +372,7 @@ async def cancel_payment_handler(callback: CallbackQuery, state: FSMContext, ses
     if payment_id:
         try:
             yookassa = YookassaService()
-            cancelled = yookassa.cancel_payment(payment_id)
+            cancelled = await yookassa.cancel_payment(payment_id)
             if cancelled:
                 logger.info(f"User {callback.from_user.id} | Payment {payment_id} cancelled in YooKassa")
             else:
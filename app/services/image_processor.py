@@ -7,7 +7,7 @@ import aiohttp
 import base64
 import gc
 from io import BytesIO
-from typing import Dict, List
+from typing import Dict, List, Optional
 from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 from aiogram import Bot
@@ -30,17 +30,23 @@ class ImageProcessor:
         self.openrouter_api_key = settings.OPENROUTER_API_KEY
         self.vision_model = "google/gemini-2.0-flash-exp:free"  # Fast and free vision model
 
-    async def _make_vision_request(self, payload: dict, headers: dict) -> dict:
+    async def _make_vision_request(
+        self,
+        payload: dict,
+        headers: dict,
+        timeout: Optional[aiohttp.ClientTimeout] = None
+    ) -> dict:
         """
         Make vision API request with proper timeout handling.
-        Used by retry handler for resilient API calls.
+        Used by retry handler for resilient API calls, which passes
+        the per-attempt timeout.
         """
         async with aiohttp.ClientSession() as session:
             async with session.post(
                 "https://openrouter.ai/api/v1/chat/completions",
                 json=payload,
                 headers=headers,
-                timeout=aiohttp.ClientTimeout(total=25)  # Controlled by retry handler
+                timeout=timeout or aiohttp.ClientTimeout(total=25)
             ) as response:
                 if response.status == 200:
                     return await response.json()
@@ -164,7 +170,8 @@ Your description:"""
             result = await vision_api_retry.execute_with_retry(
                 self._make_vision_request,
                 payload,
-                headers
+                headers,
+                native_timeout=True
             )
 
             # Extract description from response
@@ -33,7 +33,7 @@ class PaymentChecker:
             Dict with payment info or None if error
         """
         try:
-            payment_info = self.yookassa.get_payment_status(payment_id)
+            payment_info = await self.yookassa.get_payment_status(payment_id)
             logger.info(f"Payment {payment_id} status: {payment_info['status']}")
             return payment_info
         except Exception as e:
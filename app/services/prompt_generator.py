@@ -393,17 +393,23 @@ Be maximally creative! Use different:
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
         self.product_detector = ProductDetector()
 
-    async def _make_api_request(self, payload: dict, headers: dict) -> dict:
+    async def _make_api_request(
+        self,
+        payload: dict,
+        headers: dict,
+        timeout: Optional[aiohttp.ClientTimeout] = None
+    ) -> dict:
         """
         Make API request with proper timeout handling.
-        Used by retry handler for resilient API calls.
+        Used by retry handler for resilient API calls, which passes
+        the per-attempt timeout.
         """
         async with aiohttp.ClientSession() as session:
             async with session.post(
                 self.base_url,
                 json=payload,
                 headers=headers,
-                timeout=aiohttp.ClientTimeout(total=30)  # Controlled by retry handler
+                timeout=timeout or aiohttp.ClientTimeout(total=30)
             ) as response:
                 if response.status == 200:
                     return await response.json()
@@ -521,7 +527,8 @@ Return result STRICTLY in JSON format with exactly {num_styles} styles."""
             result = await prompt_api_retry.execute_with_retry(
                 self._make_api_request,
                 payload,
-                headers
+                headers,
+                native_timeout=True
             )
 
             content = result['choices'][0]['message']['content']
@@ -676,7 +683,8 @@ Return result STRICTLY in JSON format with exactly {num_variations} style variat
             result = await prompt_api_retry.execute_with_retry(
                 self._make_api_request,
                 payload,
-                headers
+                headers,
+                native_timeout=True
             )
 
             content = result['choices'][0]['message']['content']
@@ -2,22 +2,32 @@
 Style Manager Service
 """
 import logging
+from collections import defaultdict
 from typing import List, Dict, Optional
+from cachetools import TTLCache
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from app.database.crud import (
     create_style_preset,
     get_user_style_presets,
+    get_presets_for_users,
     get_style_preset_by_id,
+    get_preset_style_fields,
     update_style_preset,
     delete_style_preset,
     count_user_active_presets,
     get_or_create_user
 )
+from app.database.models import User
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Applied style payloads keyed by (telegram_id, preset_id).
+# Invalidated on rename/delete/aspect ratio update.
+_applied_style_cache: TTLCache = TTLCache(maxsize=1024, ttl=60)
+
 class StyleManager:
     """Manages user saved styles"""
     
@@ -56,17 +66,21 @@ class StyleManager:
             
             logger.info(f"User {telegram_id} | Creating style preset in DB with database user_id={database_user_id}...")
             
-            # Pass database user.id to create_style_preset
-            preset = await create_style_preset(session, database_user_id, name, style_data)
+            # Pass database user.id to create_style_preset.
+            # Limit check and insert share one transaction with a single commit.
+            preset = await create_style_preset(session, database_user_id, name, style_data, commit=False)
+            await session.commit()
             
             logger.info(f"User {telegram_id} | Style '{name}' saved successfully | preset_id: {preset.id}")
             
             return {"success": True, "preset_id": preset.id, "error": None}
             
         except IntegrityError as e:
+            await session.rollback()
+
             # More specific handling of integrity errors
             error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
-            logger.error(f"User {telegram_id} | Database integrity error saving style: {error_msg}", exc_info=True)
+            logger.warning(f"User {telegram_id} | Database integrity error saving style: {error_msg}")
             
             # User-friendly error message
             if "foreign key" in error_msg.lower():
@@ -77,6 +91,7 @@ class StyleManager:
                 return {"success": False, "error": "Ошибка базы данных"}
             
         except Exception as e:
+            await session.rollback()
             logger.error(f"User {telegram_id} | Unexpected error saving style: {e}", exc_info=True)
             return {"success": False, "error": "Непредвиденная ошибка"}
     
@@ -107,9 +122,44 @@ class StyleManager:
             logger.error(f"User {telegram_id} | Error getting styles: {e}", exc_info=True)
             return []
     
+    @staticmethod
+    async def get_styles_bulk(session: AsyncSession, telegram_ids: List[int]) -> Dict[int, List[Dict]]:
+        """Get saved styles for several users, keyed by telegram_id"""
+        styles: Dict[int, List[Dict]] = defaultdict(list)
+        if not telegram_ids:
+            return styles
+
+        try:
+            # Resolve telegram ids to database ids in one query
+            result = await session.execute(
+                select(User.id, User.telegram_id).where(User.telegram_id.in_(telegram_ids))
+            )
+            telegram_by_db_id = {user_id: telegram_id for user_id, telegram_id in result.all()}
+
+            presets = await get_presets_for_users(session, list(telegram_by_db_id))
+            logger.info(f"Loaded {len(presets)} saved styles for {len(telegram_by_db_id)} users")
+
+            for p in presets:
+                styles[telegram_by_db_id[p.user_id]].append({
+                    "id": p.id,
+                    "name": p.name,
+                    "product_name": p.style_data.get("product_name", "Unknown"),
+                    "aspect_ratio": p.style_data.get("aspect_ratio", "1:1"),
+                    "created_at": p.created_at
+                })
+            return styles
+        except Exception as e:
+            logger.error(f"Error getting styles for {len(telegram_ids)} users: {e}", exc_info=True)
+            return defaultdict(list)
+
     @staticmethod
     async def apply_style(session: AsyncSession, telegram_id: int, preset_id: int) -> Optional[Dict]:
         """Apply saved style preset"""
+        cached = _applied_style_cache.get((telegram_id, preset_id))
+        if cached is not None:
+            logger.info(f"User {telegram_id} | Style preset {preset_id} applied from cache")
+            return dict(cached)
+
         try:
             logger.info(f"User {telegram_id} | Applying style preset {preset_id}...")
             
@@ -117,18 +167,21 @@ class StyleManager:
             user = await get_or_create_user(session, telegram_id=telegram_id)
             database_user_id = user.id
             
-            preset = await get_style_preset_by_id(session, preset_id, database_user_id)
+            fields = await get_preset_style_fields(session, preset_id, database_user_id)
             
-            if not preset:
+            if not fields:
                 logger.warning(f"User {telegram_id} | Style preset {preset_id} not found")
                 return None
             
-            logger.info(f"User {telegram_id} | Style preset '{preset.name}' applied successfully")
-            return {
-                "product_name": preset.style_data["product_name"],
-                "aspect_ratio": preset.style_data["aspect_ratio"],
-                "styles": preset.style_data["prompts"]
+            name, product_name, aspect_ratio, prompts = fields
+            logger.info(f"User {telegram_id} | Style preset '{name}' applied successfully")
+            style = {
+                "product_name": product_name,
+                "aspect_ratio": aspect_ratio,
+                "styles": prompts
             }
+            _applied_style_cache[(telegram_id, preset_id)] = style
+            return dict(style)
         except Exception as e:
             logger.error(f"User {telegram_id} | Error applying style: {e}", exc_info=True)
             return None
@@ -144,6 +197,7 @@ class StyleManager:
             database_user_id = user.id
             
             result = await delete_style_preset(session, preset_id, database_user_id)
+            _applied_style_cache.pop((telegram_id, preset_id), None)
             
             if result:
                 logger.info(f"User {telegram_id} | Style preset {preset_id} deleted successfully")
@@ -166,6 +220,7 @@ class StyleManager:
             database_user_id = user.id
 
             preset = await update_style_preset(session, preset_id, database_user_id, name=new_name)
+            _applied_style_cache.pop((telegram_id, preset_id), None)
 
             if preset:
                 logger.info(f"User {telegram_id} | Style preset {preset_id} renamed successfully")
@@ -205,6 +260,7 @@ class StyleManager:
                 database_user_id,
                 style_data=updated_style_data
             )
+            _applied_style_cache.pop((telegram_id, preset_id), None)
 
             if updated_preset:
                 logger.info(f"User {telegram_id} | Aspect ratio for style preset {preset_id} updated successfully")
@@ -3,6 +3,7 @@ Webhook server for YooKassa payment notifications
 This should be run as a separate service alongside the bot
 """
 import logging
+import orjson
 from aiohttp import web
 from typing import Optional
 
@@ -11,6 +12,12 @@ from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Resolved lazily on the first webhook to avoid circular imports
+_process_payment_webhook = None
+
+# Pre-encoded health check payload (aiohttp responses themselves can't be reused)
+_HEALTH_BODY = b"OK"
+
 
 async def handle_yookassa_webhook(request: web.Request) -> web.Response:
     """
@@ -24,20 +31,24 @@ async def handle_yookassa_webhook(request: web.Request) -> web.Response:
         "object": { ... payment data ... }
     }
     """
+    global _process_payment_webhook
+
     try:
-        # Get JSON body
-        notification_data = await request.json()
+        # Parse JSON body
+        notification_data = orjson.loads(await request.read())
 
         logger.info(f"Received YooKassa webhook: {notification_data.get('event')}")
 
-        # Import here to avoid circular dependencies
-        from app.handlers.payment import process_payment_webhook
+        # Import on first use to avoid circular dependencies
+        if _process_payment_webhook is None:
+            from app.handlers.payment import process_payment_webhook
+            _process_payment_webhook = process_payment_webhook
 
         # Get bot instance from app state
         bot = request.app.get('bot')
 
         # Process payment webhook
-        success = await process_payment_webhook(notification_data, bot)
+        success = await _process_payment_webhook(notification_data, bot)
 
         if success:
             # YooKassa requires HTTP 200 response to confirm receipt
@@ -55,7 +66,7 @@ async def handle_yookassa_webhook(request: web.Request) -> web.Response:
 
 async def health_check(request: web.Request) -> web.Response:
     """Health check endpoint"""
-    return web.Response(text="OK")
+    return web.Response(body=_HEALTH_BODY, content_type="text/plain")
 
 
 def create_app(bot=None) -> web.Application:
@@ -87,9 +98,10 @@ async def run_webhook_server(host: str = '0.0.0.0', port: int = 8080, bot=None):
         port: Server port
         bot: Optional Bot instance for sending notifications
     """
-    # Initialize database
-    logger.info("Initializing database for webhook server...")
-    init_db(settings.database_url)
+    # Initialize database (reuse the bot's engine when running in-process)
+    if get_db() is None:
+        logger.info("Initializing database for webhook server...")
+        init_db(settings.database_url)
 
     app = create_app(bot)
 
@@ -109,10 +121,9 @@ async def run_webhook_server(host: str = '0.0.0.0', port: int = 8080, bot=None):
 if __name__ == "__main__":
     import asyncio
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    from app.utils.logging_config import setup_queue_logging
+
+    setup_queue_logging(level=logging.INFO)
 
     loop = asyncio.get_event_loop()
     loop.run_until_complete(run_webhook_server())
@@ -12,15 +12,20 @@ https://yandex.ru/dev/metrika/doc/api2/management/offline_conversions/offline_co
 """
 
 import asyncio
+import calendar
 import csv
 import io
 import logging
+import random
+import time
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from contextlib import asynccontextmanager
 
 import aiohttp
-from sqlalchemy import select, update
+from cachetools import TTLCache
+from sqlalchemy import Integer, any_, bindparam, insert, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
@@ -29,6 +34,17 @@ from app.database.models import UTMEvent, User
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of events loaded and uploaded per request to Metrika
+BATCH_SIZE = 10_000
+
+# Queued analytics events: max backlog, rows per bulk insert, flush interval (seconds)
+EVENT_QUEUE_MAXSIZE = 10_000
+EVENT_FLUSH_BATCH_SIZE = 1000
+EVENT_FLUSH_INTERVAL = 5
+
+# Conversions without a price leave Price/Currency cells empty
+CSV_FIELDNAMES = ["UserId", "Target", "DateTime", "Price", "Currency"]
+
 
 class YandexMetrikaService:
     """Service for tracking events and uploading to Yandex Metrika"""
@@ -37,6 +53,26 @@ class YandexMetrikaService:
         self.counter_id = settings.YANDEX_METRIKA_COUNTER_ID
         self.token = settings.YANDEX_METRIKA_TOKEN
         self.is_enabled = settings.is_metrika_enabled
+        self.track_locally = settings.TRACK_EVENTS_LOCALLY
+
+        # Metrika goal names, resolved once
+        self._goal_start = settings.METRIKA_GOAL_START
+        self._goal_first_image = settings.METRIKA_GOAL_FIRST_PHOTOSHOOT
+        self._goal_purchase = settings.METRIKA_GOAL_PURCHASE
+
+        # Shared HTTP session, created lazily inside the running event loop
+        self._http: Optional[aiohttp.ClientSession] = None
+
+        # Non-purchase events waiting for bulk insert by periodic_event_flush.
+        # Only used while the flush task is running.
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_MAXSIZE)
+        self._flush_running = False
+        # Batch whose insert failed; retried before anything new is taken from the queue
+        self._retry_batch: List[Dict[str, Any]] = []
+
+        # user_id -> metrika_client_id. Only non-empty ids are cached: once
+        # assigned, a client id never changes, so no invalidation is needed.
+        self._client_id_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
 
         if self.is_enabled:
             self.api_url = (
@@ -53,6 +89,21 @@ class YandexMetrikaService:
                 "To enable, set YANDEX_METRIKA_COUNTER_ID and YANDEX_METRIKA_TOKEN in .env"
             )
 
+    async def _get_http(self) -> aiohttp.ClientSession:
+        """Get shared HTTP session (keeps connections and TLS sessions alive between calls)"""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=8, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._http
+
+    async def aclose(self):
+        """Close shared HTTP session on application shutdown"""
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+
     async def track_event(
         self,
         session: AsyncSession,
@@ -61,7 +112,7 @@ class YandexMetrikaService:
         event_value: Optional[float] = None,
         currency: str = "RUB",
         event_data: Optional[Dict[str, Any]] = None
-    ) -> Optional[UTMEvent]:
+    ) -> Optional[int]:
         """
         Track an event to database. Will be uploaded to Metrika later.
 
@@ -74,53 +125,120 @@ class YandexMetrikaService:
             event_data: Optional additional data as JSON
 
         Returns:
-            Created UTMEvent object or None if failed
+            ID of the created UTMEvent or None if queued, failed or skipped
         """
+        # Nobody consumes non-conversion events without Metrika or local analytics
+        if not self.is_enabled and not self.track_locally and event_type != "purchase":
+            return None
+
         try:
             # Get user's metrika_client_id
-            user = await session.get(User, user_id)
-            if not user:
-                logger.error(f"User {user_id} not found when tracking event {event_type}")
-                return None
-
-            if not user.metrika_client_id:
-                logger.warning(
-                    f"User {user_id} has no metrika_client_id. "
-                    f"Event {event_type} will be tracked without Metrika integration."
-                )
-
-            # Create event record
-            event = UTMEvent(
-                user_id=user_id,
-                event_type=event_type,
-                metrika_client_id=user.metrika_client_id,
-                event_value=event_value,
-                currency=currency,
-                event_data=event_data or {},
-                sent_to_metrika=False,
-                created_at=datetime.utcnow()
-            )
+            metrika_client_id = self._client_id_cache.get(user_id)
+            if metrika_client_id is None:
+                user = await session.get(User, user_id)
+                if not user:
+                    logger.error(f"User {user_id} not found when tracking event {event_type}")
+                    return None
+
+                metrika_client_id = user.metrika_client_id
+                if metrika_client_id:
+                    self._client_id_cache[user_id] = metrika_client_id
+                else:
+                    logger.warning(
+                        f"User {user_id} has no metrika_client_id. "
+                        f"Event {event_type} will be tracked without Metrika integration."
+                    )
 
-            session.add(event)
+            now = time.time()
+            row = {
+                "user_id": user_id,
+                "event_type": event_type,
+                "metrika_client_id": metrika_client_id,
+                "event_value": event_value,
+                "currency": currency,
+                "event_data": event_data or {},
+                "sent_to_metrika": False,
+                "created_at": datetime.utcfromtimestamp(now),
+                "created_at_unix": int(now)
+            }
+
+            # Analytics events are bulk inserted in the background;
+            # purchases (and overflow) are written immediately
+            if self._flush_running and event_type != "purchase":
+                try:
+                    self._queue.put_nowait(row)
+                    logger.info(f"Event queued: {event_type} for user {user_id}")
+                    return None
+                except asyncio.QueueFull:
+                    logger.warning(f"Event queue full, writing {event_type} for user {user_id} directly")
+
+            # Create event record (no ORM refresh needed, only the id is returned)
+            stmt = insert(UTMEvent).values(**row).returning(UTMEvent.id)
+            event_id = (await session.execute(stmt)).scalar_one()
             await session.commit()
-            await session.refresh(event)
 
             logger.info(
                 f"Event tracked: {event_type} for user {user_id} "
-                f"(metrika_client_id: {user.metrika_client_id or 'N/A'})"
+                f"(metrika_client_id: {metrika_client_id or 'N/A'})"
             )
 
-            return event
+            return event_id
 
         except Exception as e:
             logger.error(f"Error tracking event {event_type} for user {user_id}: {e}", exc_info=True)
             await session.rollback()
             return None
 
+    @property
+    def has_pending_events(self) -> bool:
+        """Whether queued or failed events are waiting for flush_events"""
+        return bool(self._retry_batch) or not self._queue.empty()
+
+    async def flush_events(self, session: AsyncSession) -> int:
+        """
+        Bulk insert up to EVENT_FLUSH_BATCH_SIZE queued events.
+
+        If the insert fails or is cancelled, the batch is kept and retried on
+        the next flush, so a transient database error or shutdown doesn't drop
+        events.
+
+        Args:
+            session: Database session
+
+        Returns:
+            Number of events written
+        """
+        batch = self._retry_batch
+        self._retry_batch = []
+        while len(batch) < EVENT_FLUSH_BATCH_SIZE and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        if not batch:
+            return 0
+
+        try:
+            await session.execute(insert(UTMEvent), batch)
+            await session.commit()
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} queued events, will retry: {e}", exc_info=True)
+            self._retry_batch = batch
+            await session.rollback()
+            return 0
+        except BaseException:
+            # Cancelled mid-insert (e.g. at shutdown): keep the batch for the final drain
+            self._retry_batch = batch
+            raise
+
+        logger.debug(f"Flushed {len(batch)} queued events to database")
+        return len(batch)
+
     async def upload_pending_events(self, session: AsyncSession) -> bool:
         """
         Upload all pending events to Yandex Metrika.
 
+        Events are uploaded in batches of BATCH_SIZE so a large backlog
+        never has to be loaded into memory at once.
+
         Args:
             session: Database session
 
@@ -132,94 +250,114 @@ class YandexMetrikaService:
             return True
 
         try:
-            # Get all unsent events with metrika_client_id
-            stmt = (
-                select(UTMEvent)
-                .where(UTMEvent.sent_to_metrika == False)
-                .where(UTMEvent.metrika_client_id.isnot(None))
-                .order_by(UTMEvent.created_at)
-            )
-            result = await session.execute(stmt)
-            events = result.scalars().all()
-
-            if not events:
-                logger.debug("No pending events to upload to Metrika")
-                return True
-
-            logger.info(f"Found {len(events)} pending events to upload to Metrika")
-
-            # Separate events with and without price
-            events_with_price = []
-            events_without_price = []
-
-            for event in events:
-                # Get user's telegram_id for UserID (Telegram bots don't have ClientID from cookies)
-                user = await session.get(User, event.user_id)
-                if not user:
-                    logger.warning(f"User {event.user_id} not found for event {event.id}, skipping")
-                    continue
-
-                conversion = {
-                    "UserId": str(user.telegram_id),  # Use telegram_id as UserID
-                    "Target": self._get_goal_name(event.event_type),
-                    "DateTime": int(event.created_at.timestamp()),
-                }
-
-                # Add price for purchase events
-                if event.event_value:
-                    conversion["Price"] = float(event.event_value)
-                    conversion["Currency"] = event.currency or "RUB"
-                    events_with_price.append(conversion)
-                else:
-                    events_without_price.append(conversion)
-
-            # Upload events in separate batches (with price and without)
-            upload_id = None
-            success = True
-
-            if events_without_price:
-                logger.info(f"Uploading {len(events_without_price)} events without price")
-                upload_id = await self._upload_conversions(events_without_price)
-                if not upload_id:
-                    success = False
-
-            if events_with_price:
-                logger.info(f"Uploading {len(events_with_price)} events with price")
-                upload_id_price = await self._upload_conversions(events_with_price)
-                if not upload_id_price:
-                    success = False
-                else:
-                    upload_id = upload_id_price  # Use last upload_id for tracking
-
-            if success and upload_id:
-                # Mark events as sent
-                event_ids = [event.id for event in events]
-                stmt = (
-                    update(UTMEvent)
-                    .where(UTMEvent.id.in_(event_ids))
-                    .values(
-                        sent_to_metrika=True,
-                        sent_at=datetime.utcnow(),
-                        metrika_upload_id=upload_id
-                    )
-                )
-                await session.execute(stmt)
-                await session.commit()
-
-                logger.info(
-                    f"Successfully uploaded {len(events)} events to Metrika "
-                    f"({len(events_without_price)} without price, {len(events_with_price)} with price)"
-                )
-                return True
+            # Only events created before this point belong to the current upload
+            cutoff = datetime.utcnow()
+            total_uploaded = 0
+
+            while True:
+                uploaded = await self._upload_batch(session, cutoff)
+                if uploaded is None:
+                    logger.error("Failed to upload events to Metrika")
+                    return False
+
+                total_uploaded += uploaded
+                if uploaded < BATCH_SIZE:
+                    break
+
+            if total_uploaded:
+                logger.info(f"Successfully uploaded {total_uploaded} events to Metrika")
             else:
-                logger.error("Failed to upload events to Metrika")
-                return False
+                logger.debug("No pending events to upload to Metrika")
+            return True
 
         except Exception as e:
             logger.error(f"Error uploading events to Metrika: {e}", exc_info=True)
             await session.rollback()
             return False
 
+    async def _upload_batch(self, session: AsyncSession, cutoff: datetime) -> Optional[int]:
+        """
+        Upload one batch of pending events and mark them as sent.
+
+        Args:
+            session: Database session
+            cutoff: Upper bound for created_at of events in this upload cycle
+
+        Returns:
+            Number of events uploaded (0 if none pending) or None on failure
+        """
+        # Get the next unsent events with metrika_client_id together with
+        # the user's telegram_id (Telegram bots don't have ClientID from cookies)
+        stmt = (
+            select(UTMEvent, User.telegram_id)
+            .join(User, User.id == UTMEvent.user_id)
+            .where(UTMEvent.sent_to_metrika == False)
+            .where(UTMEvent.metrika_client_id.isnot(None))
+            .where(UTMEvent.created_at <= cutoff)
+            .order_by(UTMEvent.id)
+            .limit(BATCH_SIZE)
+        )
+        result = await session.execute(stmt)
+        rows = result.all()
+
+        if not rows:
+            return 0
+
+        logger.info(f"Found {len(rows)} pending events to upload to Metrika")
+
+        conversions = []
+        priced_count = 0
+        get_goal_name = self._get_goal_name
+
+        for event, telegram_id in rows:
+            # Rows written without created_at_unix (e.g. by a process started
+            # before the column existed) fall back to converting created_at (UTC)
+            timestamp = event.created_at_unix
+            if timestamp is None:
+                timestamp = calendar.timegm(event.created_at.utctimetuple())
+
+            conversion = {
+                "UserId": str(telegram_id),  # Use telegram_id as UserID
+                "Target": get_goal_name(event.event_type),
+                "DateTime": timestamp,
+            }
+
+            # Add price for purchase events (left empty in CSV for the rest)
+            if event.event_value:
+                conversion["Price"] = float(event.event_value)
+                conversion["Currency"] = event.currency or "RUB"
+                priced_count += 1
+
+            conversions.append(conversion)
+
+        # Upload priced and unpriced events together in a single request
+        upload_id = await self._upload_conversions(conversions)
+        if not upload_id:
+            return None
+
+        # Mark exactly the uploaded rows as sent. A range predicate could also
+        # match rows with lower ids that committed after the SELECT and were
+        # never uploaded. The ids are bound as one array parameter so the
+        # statement text stays the same for every batch size.
+        event_ids = [event.id for event, _ in rows]
+        stmt = (
+            update(UTMEvent)
+            .where(UTMEvent.id == any_(bindparam("ids", event_ids, type_=ARRAY(Integer))))
+            .values(
+                sent_to_metrika=True,
+                sent_at=datetime.utcnow(),
+                metrika_upload_id=upload_id
+            )
+        )
+        await session.execute(stmt)
+        await session.commit()
+
+        logger.info(
+            f"Uploaded batch of {len(rows)} events to Metrika "
+            f"({len(rows) - priced_count} without price, {priced_count} with price)"
+        )
+        return len(rows)
+
     def _get_goal_name(self, event_type: str) -> str:
         """
         Map event type to Metrika goal name.
@@ -230,12 +368,13 @@ class YandexMetrikaService:
         Returns:
             Metrika goal name
         """
-        mapping = {
-            "start": settings.METRIKA_GOAL_START,
-            "first_image": settings.METRIKA_GOAL_FIRST_IMAGE,
-            "purchase": settings.METRIKA_GOAL_PURCHASE,
-        }
-        return mapping.get(event_type, event_type)
+        if event_type == "start":
+            return self._goal_start
+        elif event_type == "first_image":
+            return self._goal_first_image
+        elif event_type == "purchase":
+            return self._goal_purchase
+        return event_type
 
     async def _upload_conversions(
         self,
@@ -263,51 +402,50 @@ class YandexMetrikaService:
             max_retries = 3
             retry_delay = 2  # seconds
 
+            client_session = await self._get_http()
+            headers = {
+                "Authorization": f"OAuth {self.token}"
+            }
+            params = {
+                "client_id_type": "USER_ID",  # Use USER_ID for Telegram bot (not CLIENT_ID from cookies)
+                "comment": comment
+            }
+
             for attempt in range(max_retries):
                 try:
-                    async with aiohttp.ClientSession() as client_session:
-                        headers = {
-                            "Authorization": f"OAuth {self.token}"
-                        }
-
-                        data = aiohttp.FormData()
-                        data.add_field(
-                            'file',
-                            csv_content,
-                            filename='conversions.csv',
-                            content_type='text/csv'
-                        )
-
-                        params = {
-                            "client_id_type": "USER_ID",  # Use USER_ID for Telegram bot (not CLIENT_ID from cookies)
-                            "comment": comment
-                        }
-
-                        async with client_session.post(
-                            self.api_url,
-                            headers=headers,
-                            data=data,
-                            params=params,
-                            timeout=aiohttp.ClientTimeout(total=30)
-                        ) as response:
-                            if response.status == 200:
-                                result = await response.json()
-                                upload_id = result.get('uploading', {}).get('id')
-                                logger.info(
-                                    f"Conversions uploaded successfully. "
-                                    f"Upload ID: {upload_id}, rows: {len(conversions)}"
-                                )
-                                return str(upload_id) if upload_id else None
-                            else:
-                                error_text = await response.text()
-                                logger.error(
-                                    f"Metrika API error (attempt {attempt + 1}/{max_retries}): "
-                                    f"{response.status} - {error_text}"
-                                )
-
-                                # Don't retry on client errors (4xx)
-                                if 400 <= response.status < 500:
-                                    return None
+                    data = aiohttp.FormData()
+                    data.add_field(
+                        'file',
+                        csv_content,
+                        filename='conversions.csv',
+                        content_type='text/csv'
+                    )
+
+                    async with client_session.post(
+                        self.api_url,
+                        headers=headers,
+                        data=data,
+                        params=params,
+                        timeout=aiohttp.ClientTimeout(total=30)
+                    ) as response:
+                        if response.status == 200:
+                            result = await response.json()
+                            upload_id = result.get('uploading', {}).get('id')
+                            logger.info(
+                                f"Conversions uploaded successfully. "
+                                f"Upload ID: {upload_id}, rows: {len(conversions)}"
+                            )
+                            return str(upload_id) if upload_id else None
+                        else:
+                            error_text = await response.text()
+                            logger.error(
+                                f"Metrika API error (attempt {attempt + 1}/{max_retries}): "
+                                f"{response.status} - {error_text}"
+                            )
+
+                            # Don't retry on client errors (4xx)
+                            if 400 <= response.status < 500:
+                                return None
 
                 except asyncio.TimeoutError:
                     logger.warning(
@@ -318,9 +456,9 @@ class YandexMetrikaService:
                         f"Metrika API connection error (attempt {attempt + 1}/{max_retries}): {e}"
                     )
 
-                # Wait before retry (exponential backoff)
+                # Wait before retry (exponential backoff with jitter, capped)
                 if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay * (2 ** attempt))
+                    await asyncio.sleep(min(retry_delay * (2 ** attempt) + random.uniform(0, 1), 10))
 
             logger.error(f"Failed to upload conversions after {max_retries} attempts")
             return None
@@ -329,7 +467,7 @@ class YandexMetrikaService:
             logger.error(f"Unexpected error uploading conversions: {e}", exc_info=True)
             return None
 
-    def _create_csv(self, conversions: List[Dict[str, Any]]) -> str:
+    def _create_csv(self, conversions: List[Dict[str, Any]]) -> bytes:
         """
         Create CSV file content from conversions.
 
@@ -337,27 +475,26 @@ class YandexMetrikaService:
             conversions: List of conversion dicts
 
         Returns:
-            CSV content as string
+            UTF-8 encoded CSV content (reused as-is across upload retries)
         """
-        output = io.StringIO()
-
-        # Determine fieldnames based on whether conversions have prices
-        # All conversions in a batch should be either with or without price
-        has_price = any('Price' in conv for conv in conversions)
-
-        if has_price:
-            fieldnames = ["UserId", "Target", "DateTime", "Price", "Currency"]
-        else:
-            fieldnames = ["UserId", "Target", "DateTime"]
+        # Encode straight into a bytes buffer; FormData sends bytes without re-encoding
+        buffer = io.BytesIO()
+        text = io.TextIOWrapper(buffer, encoding='utf-8', newline='', write_through=True)
 
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
+        writer = csv.DictWriter(text, fieldnames=CSV_FIELDNAMES, restval='', extrasaction='ignore')
         writer.writeheader()
         writer.writerows(conversions)
 
-        csv_content = output.getvalue()
+        text.flush()
+        text.detach()  # Keep buffer open when the wrapper is garbage collected
+        csv_content = buffer.getvalue()
 
         # Log the CSV content for debugging
-        logger.debug(f"Generated CSV for Metrika upload ({len(conversions)} conversions):\n{csv_content}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Generated CSV for Metrika upload (%d conversions):\n%s",
+                len(conversions), csv_content.decode('utf-8')
+            )
 
         return csv_content
 
@@ -383,25 +520,25 @@ class YandexMetrikaService:
                 f"counter/{self.counter_id}/offline_conversions/upload/{upload_id}"
             )
 
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"OAuth {self.token}"
-                }
-
-                async with session.get(
-                    status_url,
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        error_text = await response.text()
-                        logger.error(
-                            f"Failed to get upload status for {upload_id}: "
-                            f"{response.status} - {error_text}"
-                        )
-                        return None
+            session = await self._get_http()
+            headers = {
+                "Authorization": f"OAuth {self.token}"
+            }
+
+            async with session.get(
+                status_url,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    error_text = await response.text()
+                    logger.error(
+                        f"Failed to get upload status for {upload_id}: "
+                        f"{response.status} - {error_text}"
+                    )
+                    return None
 
         except Exception as e:
             logger.error(f"Error getting upload status for {upload_id}: {e}", exc_info=True)
@@ -438,3 +575,47 @@ async def periodic_metrika_upload(get_db_session):
             logger.error(f"Error in periodic Metrika upload: {e}", exc_info=True)
             # Continue running even if upload fails
             await asyncio.sleep(60)  # Wait 1 minute before retrying
+
+
+async def periodic_event_flush(get_db_session):
+    """
+    Background task to bulk insert queued events into the database.
+
+    While this task runs, track_event queues non-purchase events instead of
+    committing each one. Remaining events are flushed on cancellation.
+
+    Args:
+        get_db_session: Async context manager for getting database session
+    """
+    logger.info(f"Starting event flush task. Interval: {EVENT_FLUSH_INTERVAL}s")
+    metrika_service._flush_running = True
+
+    try:
+        while True:
+            try:
+                await asyncio.sleep(EVENT_FLUSH_INTERVAL)
+
+                while metrika_service.has_pending_events:
+                    async with get_db_session() as session:
+                        if not await metrika_service.flush_events(session):
+                            break
+
+            except asyncio.CancelledError:
+                logger.info("Event flush task cancelled")
+                break
+            except Exception as e:
+                logger.error(f"Error in event flush task: {e}", exc_info=True)
+    finally:
+        metrika_service._flush_running = False
+
+        # Write whatever is still queued before shutdown
+        while metrika_service.has_pending_events:
+            async with get_db_session() as session:
+                if not await metrika_service.flush_events(session):
+                    break
+
+        if metrika_service.has_pending_events:
+            logger.error(
+                f"Dropping {len(metrika_service._retry_batch) + metrika_service._queue.qsize()} "
+                f"unwritten events on shutdown"
+            )
@@ -1,4 +1,5 @@
 """YooKassa payment integration service"""
+import asyncio
 import uuid
 from decimal import Decimal
 from typing import Dict, Optional
@@ -12,16 +13,42 @@ from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+_configured = False
+
+# Static part of the 54-ФЗ receipt item; amount and description are set per payment
+_RECEIPT_ITEM_TEMPLATE = {
+    "quantity": "1",
+    "vat_code": 1,  # НДС по ставке 20%
+    "payment_mode": "full_payment",
+    "payment_subject": "service"
+}
+
+
+def _configure_once():
+    """
+    Configure YooKassa SDK credentials once per process.
+
+    Configuration is SDK-global state read by calls running in worker
+    threads, so it must not be rewritten on every service construction.
+    """
+    global _configured
+    if _configured:
+        return
+    Configuration.configure(
+        account_id=settings.YOOKASSA_SHOP_ID,
+        secret_key=settings.YOOKASSA_SECRET_KEY
+    )
+    _configured = True
+
+
+_configure_once()
+
 
 class YookassaService:
     """Service for YooKassa payment integration"""
 
     def __init__(self):
-        """Initialize YooKassa configuration"""
-        Configuration.configure(
-            account_id=settings.YOOKASSA_SHOP_ID,
-            secret_key=settings.YOOKASSA_SECRET_KEY
-        )
+        """Initialize YooKassa service (SDK is configured at import)"""
         self.return_url = settings.YOOKASSA_RETURN_URL
 
         # Validate configuration
@@ -32,7 +59,7 @@ class YookassaService:
                 "For Telegram bots, you can use your bot's link (e.g., https://t.me/your_actual_bot_username)"
             )
 
-    def create_payment(
+    async def create_payment(
         self,
         amount: float,
         description: str,
@@ -81,9 +108,11 @@ class YookassaService:
             )
             payment_data["receipt"] = receipt
 
-            # Create payment with idempotence key
-            idempotence_key = str(uuid.uuid4())
-            payment = Payment.create(payment_data, idempotence_key)
+            # Create payment with idempotence key derived from order_id,
+            # so retries for the same order are deduplicated by YooKassa
+            idempotence_key = str(uuid.uuid5(uuid.NAMESPACE_URL, f"yookassa-create:{order_id}"))
+            # SDK uses blocking requests - run it off the event loop
+            payment = await asyncio.to_thread(Payment.create, payment_data, idempotence_key)
 
             logger.info(f"Payment created: {payment.id} for order {order_id}")
 
@@ -108,7 +137,7 @@ class YookassaService:
             logger.error(f"Failed to create payment: {str(e)}")
             raise
 
-    def get_payment_status(self, payment_id: str) -> Dict:
+    async def get_payment_status(self, payment_id: str) -> Dict:
         """
         Get payment status by payment ID
 
@@ -119,7 +148,7 @@ class YookassaService:
             Dict with payment status and details
         """
         try:
-            payment = Payment.find_one(payment_id)
+            payment = await asyncio.to_thread(Payment.find_one, payment_id)
 
             return {
                 "payment_id": payment.id,
@@ -163,7 +192,7 @@ class YookassaService:
             logger.error(f"Failed to verify webhook notification: {str(e)}")
             return None
 
-    def cancel_payment(self, payment_id: str) -> bool:
+    async def cancel_payment(self, payment_id: str) -> bool:
         """
         Cancel a payment
 
@@ -174,8 +203,8 @@ class YookassaService:
             True if cancelled successfully
         """
         try:
-            idempotence_key = str(uuid.uuid4())
-            Payment.cancel(payment_id, idempotence_key)
+            idempotence_key = str(uuid.uuid5(uuid.NAMESPACE_URL, f"yookassa-cancel:{payment_id}"))
+            await asyncio.to_thread(Payment.cancel, payment_id, idempotence_key)
             logger.info(f"Payment {payment_id} cancelled")
             return True
 
@@ -213,21 +242,15 @@ class YookassaService:
                 "Предоставьте хотя бы один из этих параметров."
             )
 
-        receipt = {
-            "items": [
-                {
-                    "description": description,
-                    "quantity": "1",
-                    "amount": {
-                        "value": f"{amount:.2f}",
-                        "currency": "RUB"
-                    },
-                    "vat_code": 1,  # НДС по ставке 20%
-                    "payment_mode": "full_payment",
-                    "payment_subject": "service"
-                }
-            ]
+        item = {
+            **_RECEIPT_ITEM_TEMPLATE,
+            "description": description,
+            "amount": {
+                "value": f"{amount:.2f}",
+                "currency": "RUB"
+            }
         }
+        receipt = {"items": [item]}
 
         # Add customer info for receipt delivery
         customer = {}
@@ -2,15 +2,20 @@
 API Retry Handler with Exponential Backoff and Circuit Breaker
 
 Provides resilient API call handling with:
-- Exponential backoff for transient failures
+- Exponential backoff with full jitter for transient failures
 - Circuit breaker to prevent cascading failures
 - Configurable timeouts and retry attempts
+- Optional TTL cache of successful responses
+- Coalescing of concurrent calls sharing a cache key
+- Optional stale-response fallback while the circuit is open
 """
 import asyncio
+import random
 import time
 import logging
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Dict
 import aiohttp
+from cachetools import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -37,7 +42,10 @@ class APIRetryHandler:
         max_delay: float = 30.0,
         timeout_base: float = 15.0,
         circuit_failure_threshold: int = 5,
-        circuit_timeout: float = 60.0
+        circuit_timeout: float = 60.0,
+        cache_maxsize: int = 1024,
+        cache_ttl: float = 300.0,
+        stale_ttl: float = 3600.0
     ):
         """
         Initialize retry handler.
@@ -49,6 +57,9 @@ class APIRetryHandler:
             timeout_base: Base timeout for API calls (increases with retries)
             circuit_failure_threshold: Failures needed to open circuit
             circuit_timeout: Time to wait before attempting recovery (seconds)
+            cache_maxsize: Maximum number of cached responses
+            cache_ttl: Default lifetime of cached responses (seconds)
+            stale_ttl: How long responses stay usable as a fallback while the circuit is open (seconds)
         """
         self.max_retries = max_retries
         self.base_delay = base_delay
@@ -57,17 +68,35 @@ class APIRetryHandler:
         self.circuit_failure_threshold = circuit_failure_threshold
         self.circuit_timeout = circuit_timeout
 
+        # Per-attempt schedules (settings are fixed for the handler's lifetime);
+        # _delays holds the backoff cap, the actual sleep is jittered below it
+        self._delays = tuple(min(base_delay * (2 ** i), max_delay) for i in range(max_retries))
+        self._timeouts = tuple(timeout_base + i * 5 for i in range(max_retries))
+        self._client_timeouts = tuple(aiohttp.ClientTimeout(total=t) for t in self._timeouts)
+
         # Circuit breaker state
         self._failure_count = 0
         self._circuit_open = False
         self._circuit_open_time = 0
         self._lock = asyncio.Lock()
 
+        # Response cache: cache_key -> (result, stored_at)
+        self._cache: TTLCache = TTLCache(maxsize=cache_maxsize, ttl=cache_ttl)
+        # Longer-lived copy served only when allow_stale is set and the circuit is open
+        self._stale_cache: TTLCache = TTLCache(maxsize=cache_maxsize, ttl=stale_ttl)
+
+        # In-flight calls: cache_key -> future shared by concurrent callers
+        self._inflight: Dict[str, asyncio.Future] = {}
+
     async def _check_circuit(self):
         """Check circuit breaker state and update if needed"""
+        # CLOSED fast path: plain attribute read, no lock needed
+        if not self._circuit_open:
+            return
+
         async with self._lock:
             if self._circuit_open:
-                elapsed = time.time() - self._circuit_open_time
+                elapsed = time.monotonic() - self._circuit_open_time
                 if elapsed >= self.circuit_timeout:
                     # Attempt recovery - move to HALF_OPEN
                     logger.info("Circuit breaker attempting recovery (HALF_OPEN)")
@@ -81,9 +110,13 @@ class APIRetryHandler:
 
     async def _record_success(self):
         """Record successful API call"""
+        # Nothing to reset on the common path
+        if self._failure_count == 0 and not self._circuit_open:
+            return
+
         async with self._lock:
             if self._failure_count > 0:
-                logger.info(f"API recovered - resetting failure count from {self._failure_count}")
+                logger.info("API recovered - resetting failure count from %d", self._failure_count)
             self._failure_count = 0
             self._circuit_open = False
 
@@ -91,20 +124,25 @@ class APIRetryHandler:
         """Record failed API call and potentially open circuit"""
         async with self._lock:
             self._failure_count += 1
-            logger.warning(f"API failure count: {self._failure_count}/{self.circuit_failure_threshold}")
+            logger.warning("API failure count: %d/%d", self._failure_count, self.circuit_failure_threshold)
 
             if self._failure_count >= self.circuit_failure_threshold:
                 self._circuit_open = True
-                self._circuit_open_time = time.time()
+                self._circuit_open_time = time.monotonic()
                 logger.error(
-                    f"Circuit breaker OPENED due to {self._failure_count} consecutive failures. "
-                    f"Will retry after {self.circuit_timeout}s"
+                    "Circuit breaker OPENED due to %d consecutive failures. "
+                    "Will retry after %ss",
+                    self._failure_count, self.circuit_timeout
                 )
 
     async def execute_with_retry(
         self,
         api_call: Callable,
         *args,
+        cache_key: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        allow_stale: bool = False,
+        native_timeout: bool = False,
         **kwargs
     ) -> Any:
         """
@@ -113,6 +151,13 @@ class APIRetryHandler:
         Args:
             api_call: Async function to execute
             *args, **kwargs: Arguments to pass to api_call
+            cache_key: Optional key; identical keys reuse a cached successful result
+                and concurrent calls with the same key share one upstream request
+            allow_stale: Return an older cached result for cache_key instead of
+                raising CircuitBreakerOpen while the circuit is open
+            native_timeout: api_call accepts a `timeout` kwarg (aiohttp.ClientTimeout)
+                and enforces it itself, so no asyncio.wait_for wrapper is needed
+            cache_ttl: Optional max age (seconds) of a cached result, shorter than the default
 
         Returns:
             Result from api_call
@@ -121,68 +166,126 @@ class APIRetryHandler:
             CircuitBreakerOpen: If circuit breaker is open
             Exception: If all retries exhausted
         """
+        # Serve cached result without touching the circuit or the network
+        if cache_key is not None:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                result, stored_at = cached
+                if cache_ttl is None or time.monotonic() - stored_at <= cache_ttl:
+                    logger.debug("API response served from cache: %s", cache_key)
+                    return result
+
+            # Join an identical call that is already running
+            inflight = self._inflight.get(cache_key)
+            while inflight is not None:
+                logger.debug("Joining in-flight API call: %s", cache_key)
+                try:
+                    return await asyncio.shield(inflight)
+                except asyncio.CancelledError:
+                    # Only our own cancellation propagates; if the caller running
+                    # the request was cancelled, run it (or join a new one) instead
+                    if not inflight.cancelled() or asyncio.current_task().cancelling():
+                        raise
+                    logger.debug("In-flight API call was cancelled, retrying: %s", cache_key)
+                inflight = self._inflight.get(cache_key)
+
+            future = asyncio.get_running_loop().create_future()
+            # Mark exception as retrieved when no other caller joined
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[cache_key] = future
+            try:
+                result = await self._execute(api_call, args, kwargs, cache_key, allow_stale, native_timeout)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                self._inflight.pop(cache_key, None)
+
+        return await self._execute(api_call, args, kwargs, cache_key, allow_stale, native_timeout)
+
+    async def _execute(
+        self,
+        api_call: Callable,
+        args: tuple,
+        kwargs: dict,
+        cache_key: Optional[str],
+        allow_stale: bool = False,
+        native_timeout: bool = False
+    ) -> Any:
+        """Run api_call through the circuit breaker and retry loop"""
         # Check circuit breaker
-        await self._check_circuit()
+        try:
+            await self._check_circuit()
+        except CircuitBreakerOpen:
+            if allow_stale and cache_key is not None:
+                stale = self._stale_cache.get(cache_key)
+                if stale is not None:
+                    logger.warning("Circuit open - serving stale response for %s", cache_key)
+                    return stale[0]
+            raise
 
         last_exception = None
 
         for attempt in range(self.max_retries):
             try:
-                # Calculate timeout for this attempt (increases with retries)
-                timeout_seconds = self.timeout_base + (attempt * 5)
+                # Timeout for this attempt (increases with retries)
+                timeout_seconds = self._timeouts[attempt]
 
                 logger.info(
-                    f"API call attempt {attempt + 1}/{self.max_retries} "
-                    f"(timeout: {timeout_seconds}s)"
+                    "API call attempt %d/%d (timeout: %ss)",
+                    attempt + 1, self.max_retries, timeout_seconds
                 )
 
                 # Execute with timeout
-                result = await asyncio.wait_for(
-                    api_call(*args, **kwargs),
-                    timeout=timeout_seconds
-                )
+                if native_timeout:
+                    result = await api_call(*args, timeout=self._client_timeouts[attempt], **kwargs)
+                else:
+                    result = await asyncio.wait_for(
+                        api_call(*args, **kwargs),
+                        timeout=timeout_seconds
+                    )
 
                 # Success - reset failure tracking
                 await self._record_success()
+                if cache_key is not None:
+                    entry = (result, time.monotonic())
+                    self._cache[cache_key] = entry
+                    self._stale_cache[cache_key] = entry
                 return result
 
-            except asyncio.TimeoutError as e:
-                last_exception = e
-                logger.warning(
-                    f"API timeout on attempt {attempt + 1}/{self.max_retries} "
-                    f"(timeout was {timeout_seconds}s)"
-                )
-
-                if attempt < self.max_retries - 1:
-                    delay = min(self.base_delay * (2 ** attempt), self.max_delay)
-                    logger.info(f"Retrying in {delay}s...")
-                    await asyncio.sleep(delay)
-                continue
-
-            except (aiohttp.ClientError, aiohttp.ServerTimeoutError) as e:
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                # Transient failure (aiohttp.ServerTimeoutError is covered by both)
                 last_exception = e
                 logger.warning(
-                    f"API error on attempt {attempt + 1}/{self.max_retries}: {type(e).__name__}"
+                    "API %s on attempt %d/%d (timeout was %ss)",
+                    type(e).__name__, attempt + 1, self.max_retries, timeout_seconds
                 )
 
                 if attempt < self.max_retries - 1:
-                    delay = min(self.base_delay * (2 ** attempt), self.max_delay)
-                    logger.info(f"Retrying in {delay}s...")
+                    # Full jitter spreads out retries from clients that failed together
+                    delay = random.uniform(0, self._delays[attempt])
+                    logger.info("Retrying in %.2fs...", delay)
                     await asyncio.sleep(delay)
                 continue
 
             except Exception as e:
                 # Unexpected error - don't retry
                 last_exception = e
-                logger.error(f"Unexpected error in API call: {e}", exc_info=True)
+                logger.error("Unexpected error in API call: %s", e, exc_info=True)
                 break
 
         # All retries failed
         await self._record_failure()
 
         logger.error(
-            f"All {self.max_retries} retry attempts exhausted. "
-            f"Last error: {type(last_exception).__name__}: {last_exception}"
+            "All %d retry attempts exhausted. Last error: %s: %s",
+            self.max_retries, type(last_exception).__name__, last_exception
         )
 
         raise last_exception
@@ -1,11 +1,21 @@
+import logging
 from functools import wraps
 from typing import Callable, Any
 from aiogram import types
+from cachetools import TTLCache
 
 from app.database import get_db
 from app.database.crud import is_admin
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# ADMIN_IDS is fixed at startup; parse it once for O(1) membership checks
+_ADMIN_IDS = frozenset(settings.admin_ids_list)
+
+# Short-lived cache of database admin checks: telegram_id -> bool
+_admin_cache = TTLCache(maxsize=256, ttl=60)
+
 
 def admin_only(func: Callable) -> Callable:
     """
@@ -29,14 +39,18 @@ def admin_only(func: Callable) -> Callable:
             send_method = message_or_callback.message.answer
 
         # Check if user is admin (check both config and database)
-        is_admin_in_config = telegram_id in settings.admin_ids_list
-
-        is_admin_in_db = False
-        db = get_db()
-        async with db.get_session() as session:
-            is_admin_in_db = await is_admin(session, telegram_id)
-
-        if is_admin_in_config or is_admin_in_db:
+        # Config admins never touch the database
+        is_admin_user = telegram_id in _ADMIN_IDS
+
+        if not is_admin_user:
+            is_admin_user = _admin_cache.get(telegram_id)
+            if is_admin_user is None:
+                db = get_db()
+                async with db.get_session() as session:
+                    is_admin_user = await is_admin(session, telegram_id)
+                _admin_cache[telegram_id] = is_admin_user
+
+        if is_admin_user:
             return await func(message_or_callback, *args, **kwargs)
         else:
             await send_method("❌ У вас нет доступа к этой функции.")
@@ -78,14 +92,10 @@ def log_action(action_name: str):
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         async def wrapper(message_or_callback: types.Message | types.CallbackQuery, *args, **kwargs) -> Any:
-            # Get user info
-            if isinstance(message_or_callback, types.Message):
-                user = message_or_callback.from_user
-            else:
-                user = message_or_callback.from_user
+            # Messages and callback queries both carry from_user
+            user = message_or_callback.from_user
 
-            # Log action (in production, use proper logging)
-            print(f"[{action_name}] User {user.id} (@{user.username})")
+            logger.info("[%s] User %d (@%s)", action_name, user.id, user.username)
 
             return await func(message_or_callback, *args, **kwargs)
         return wrapper
@@ -106,7 +116,7 @@ def error_handler(func: Callable) -> Callable:
     async def wrapper(message_or_callback: types.Message | types.CallbackQuery, *args, **kwargs) -> Any:
         try:
             return await func(message_or_callback, *args, **kwargs)
-        except Exception as e:
+        except Exception:
             # Get send method
             if isinstance(message_or_callback, types.Message):
                 send_method = message_or_callback.answer
@@ -119,8 +129,7 @@ def error_handler(func: Callable) -> Callable:
                 "Попробуйте еще раз или обратитесь в поддержку."
             )
 
-            # Log error (in production, use proper logging)
-            print(f"Error in {func.__name__}: {str(e)}")
+            logger.exception("Error in %s", func.__name__)
 
             return None
 
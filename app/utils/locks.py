@@ -4,17 +4,38 @@ User processing locks to prevent concurrent image processing with automatic clea
 import asyncio
 import time
 import logging
-from typing import Dict, Set
-from collections import defaultdict
+from typing import Dict, List, Set
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
 
+# Number of independent lock tables; users are spread across them by id
+LOCK_SHARDS = 16
+
+# Hard cap on users tracked in memory, split evenly across shards
+MAX_TRACKED_USERS = 10_000
+MAX_TRACKED_USERS_PER_SHARD = MAX_TRACKED_USERS // LOCK_SHARDS
+
+
+class _LockShard:
+    """Lock table for a subset of users, guarded by its own main lock"""
+
+    def __init__(self):
+        self.main_lock = asyncio.Lock()
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.processing: Set[int] = set()
+        # Ordered by last use, oldest first, for LRU eviction
+        self.timestamps: "OrderedDict[int, float]" = OrderedDict()
+
 
 class UserProcessingLock:
     """
     Manages locks for user image processing to prevent concurrent requests.
     Features automatic cleanup of stale locks to prevent memory leaks.
+
+    State is split into LOCK_SHARDS shards keyed by user_id, so unrelated
+    users don't serialize on a single main lock.
     """
     def __init__(self, cleanup_interval: int = 300):
         """
@@ -23,45 +44,79 @@ class UserProcessingLock:
         Args:
             cleanup_interval: Time in seconds between cleanup cycles (default: 5 minutes)
         """
-        self._locks: Dict[int, asyncio.Lock] = {}
-        self._processing: Set[int] = set()
-        self._main_lock = asyncio.Lock()
+        self._shards: List[_LockShard] = [_LockShard() for _ in range(LOCK_SHARDS)]
 
         # Tracking for automatic cleanup
-        self._lock_timestamps: Dict[int, float] = defaultdict(float)
         self._cleanup_interval = cleanup_interval
-        self._last_cleanup = time.time()
+        self._last_cleanup = time.monotonic()
 
-    async def _cleanup_old_locks(self):
+    def _shard(self, user_id: int) -> _LockShard:
+        """Get the shard holding state for user_id"""
+        return self._shards[user_id % LOCK_SHARDS]
+
+    @staticmethod
+    def _evict_lru(shard: _LockShard):
         """
-        Remove locks that haven't been used recently.
-        Prevents memory leaks from accumulated lock objects.
+        Drop least recently used users until the shard tracks at most
+        MAX_TRACKED_USERS_PER_SHARD of them. Processing users and users whose
+        lock is held are never evicted. Caller must hold shard.main_lock.
         """
-        now = time.time()
-
-        # Only cleanup periodically
-        if now - self._last_cleanup < self._cleanup_interval:
+        excess = len(shard.timestamps) - MAX_TRACKED_USERS_PER_SHARD
+        if excess <= 0:
             return
 
-        async with self._main_lock:
-            to_remove = [
-                user_id for user_id, ts in self._lock_timestamps.items()
-                if (now - ts > self._cleanup_interval
-                    and user_id not in self._processing)
-            ]
+        evict = []
+        for user_id in shard.timestamps:
+            lock = shard.locks.get(user_id)
+            if user_id not in shard.processing and (lock is None or not lock.locked()):
+                evict.append(user_id)
+                if len(evict) == excess:
+                    break
 
-            for user_id in to_remove:
-                if user_id in self._locks and not self._locks[user_id].locked():
-                    del self._locks[user_id]
-                    del self._lock_timestamps[user_id]
+        for user_id in evict:
+            del shard.timestamps[user_id]
+            shard.locks.pop(user_id, None)
 
-            self._last_cleanup = now
+    async def _cleanup_old_locks(self, now: float):
+        """
+        Remove locks that haven't been used recently.
+        Prevents memory leaks from accumulated lock objects.
 
-            if to_remove:
-                logger.info(
-                    f"Lock cleanup: removed {len(to_remove)} stale locks. "
-                    f"Active locks: {len(self._locks)}, processing: {len(self._processing)}"
-                )
+        Shards are cleaned one at a time, so each pass holds only
+        one shard's lock at any moment.
+
+        Args:
+            now: Current time.monotonic() reading shared with the caller
+        """
+        # Another caller may have started cleanup already; the check and the
+        # update below run without yielding, so only one caller proceeds
+        if now - self._last_cleanup < self._cleanup_interval:
+            return
+        self._last_cleanup = now
+
+        removed = 0
+        for shard in self._shards:
+            async with shard.main_lock:
+                to_remove = [
+                    user_id for user_id, ts in shard.timestamps.items()
+                    if (now - ts > self._cleanup_interval
+                        and user_id not in shard.processing)
+                ]
+
+                for user_id in to_remove:
+                    lock = shard.locks.get(user_id)
+                    if lock is None or not lock.locked():
+                        shard.locks.pop(user_id, None)
+                        del shard.timestamps[user_id]
+
+                removed += len(to_remove)
+
+        if removed:
+            stats = self.get_stats()
+            logger.info(
+                "Lock cleanup: removed %d stale locks. Active locks: %d, processing: %d",
+                removed, stats["active_locks"], stats["processing_users"]
+            )
 
     @asynccontextmanager
     async def acquire(self, user_id: int):
@@ -74,49 +129,57 @@ class UserProcessingLock:
         Raises:
             RuntimeError: If user already has a processing request
         """
-        # Periodic cleanup of stale locks
-        await self._cleanup_old_locks()
+        now = time.monotonic()
+
+        # Periodic cleanup of stale locks (skip the call entirely when not due)
+        if now - self._last_cleanup >= self._cleanup_interval:
+            await self._cleanup_old_locks(now)
+
+        shard = self._shard(user_id)
 
-        async with self._main_lock:
+        async with shard.main_lock:
             # Check if user is already processing
-            if user_id in self._processing:
+            if user_id in shard.processing:
                 raise RuntimeError("Already processing image for this user")
 
             # Get or create lock for this user
-            if user_id not in self._locks:
-                self._locks[user_id] = asyncio.Lock()
+            lock = shard.locks.get(user_id)
+            if lock is None:
+                lock = shard.locks[user_id] = asyncio.Lock()
 
-            lock = self._locks[user_id]
-            self._processing.add(user_id)
-            self._lock_timestamps[user_id] = time.time()
+            shard.processing.add(user_id)
+            shard.timestamps[user_id] = now
+            shard.timestamps.move_to_end(user_id)
+            self._evict_lru(shard)
 
         try:
             async with lock:
                 yield
         finally:
-            async with self._main_lock:
-                self._processing.discard(user_id)
-                self._lock_timestamps[user_id] = time.time()
+            async with shard.main_lock:
+                shard.processing.discard(user_id)
+                shard.timestamps[user_id] = time.monotonic()
+                shard.timestamps.move_to_end(user_id)
 
                 # Immediate cleanup if lock is unused
-                if user_id in self._locks and user_id not in self._processing:
-                    if not self._locks[user_id].locked():
-                        del self._locks[user_id]
-                        # Keep timestamp for a bit to track usage patterns
-                        # Will be removed in periodic cleanup
+                lock = shard.locks.get(user_id)
+                if lock is not None and not lock.locked():
+                    shard.locks.pop(user_id, None)
+                    # Keep timestamp for a bit to track usage patterns
+                    # Will be removed in periodic cleanup
 
     def is_processing(self, user_id: int) -> bool:
         """Check if user is currently processing an image"""
-        return user_id in self._processing
+        return user_id in self._shard(user_id).processing
 
     def get_stats(self) -> Dict:
         """Get lock manager statistics for monitoring"""
         return {
-            "active_locks": len(self._locks),
-            "processing_users": len(self._processing),
-            "tracked_users": len(self._lock_timestamps),
+            "active_locks": sum(len(shard.locks) for shard in self._shards),
+            "processing_users": sum(len(shard.processing) for shard in self._shards),
+            "tracked_users": sum(len(shard.timestamps) for shard in self._shards),
             "cleanup_interval": self._cleanup_interval,
-            "time_since_cleanup": time.time() - self._last_cleanup
+            "time_since_cleanup": time.monotonic() - self._last_cleanup
         }
 
 
@@ -1,7 +1,15 @@
 """Logging configuration utilities"""
+import atexit
 import logging
 import sys
-from typing import Optional
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import List, Optional
+
+# Background listeners writing queued records to their streams
+_listeners: List[QueueListener] = []
+# Listener behind the root logger's QueueHandler, see setup_queue_logging
+_root_listener: Optional[QueueListener] = None
 
 def setup_logger(
     name: str,
@@ -10,6 +18,9 @@ def setup_logger(
 ) -> logging.Logger:
     """
     Set up a logger with consistent formatting.
+
+    Records are handed to a QueueHandler; a QueueListener thread does the
+    actual stdout writes, so logging calls never block the event loop on I/O.
     
     Args:
         name: Logger name (usually __name__)
@@ -36,10 +47,66 @@ def setup_logger(
         
         formatter = logging.Formatter(format_string)
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
+
+        queue = SimpleQueue()
+        listener = QueueListener(queue, handler, respect_handler_level=True)
+        listener.start()
+        _listeners.append(listener)
+
+        logger.addHandler(QueueHandler(queue))
+        # Records are emitted by our own handler; don't repeat them via root
+        logger.propagate = False
     
     return logger
 
+def setup_queue_logging(level: int = logging.INFO, format_string: Optional[str] = None):
+    """
+    Configure the root logger to write to stdout through a background thread.
+
+    Replaces any existing root handlers (like basicConfig(force=True)), so it
+    can be called again after a library such as alembic resets logging.
+
+    Args:
+        level: Root log level
+        format_string: Custom format string
+    """
+    global _root_listener
+
+    if format_string is None:
+        format_string = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(format_string))
+
+    queue = SimpleQueue()
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+        old_handler.close()
+
+    # Flush and stop the listener from a previous call before replacing it
+    if _root_listener is not None:
+        _root_listener.stop()
+        _listeners.remove(_root_listener)
+
+    listener.start()
+    _listeners.append(listener)
+    _root_listener = listener
+
+    root.addHandler(QueueHandler(queue))
+    root.setLevel(level)
+
+def stop_log_listeners():
+    """Flush queued log records and stop background listener threads."""
+    global _root_listener
+    while _listeners:
+        _listeners.pop().stop()
+    _root_listener = None
+
+atexit.register(stop_log_listeners)
+
 def log_user_action(logger: logging.Logger, user_id: int, action: str, details: str = ""):
     """
     Log user action in a consistent format.
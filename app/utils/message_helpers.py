@@ -9,6 +9,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Telegram returns "Bad Request: message is not modified: ..." for no-op edits
+_NOT_MODIFIED = "message is not modified"
+
 
 async def safe_edit_text(
     message: Message,
@@ -39,7 +42,7 @@ async def safe_edit_text(
         )
         return True
     except TelegramBadRequest as e:
-        if "message is not modified" in str(e):
+        if _NOT_MODIFIED in e.message:
             logger.debug(f"Message not modified (content unchanged): {message.message_id}")
             return False
         else:
@@ -68,7 +71,7 @@ async def safe_edit_reply_markup(
         await message.edit_reply_markup(reply_markup=reply_markup)
         return True
     except TelegramBadRequest as e:
-        if "message is not modified" in str(e):
+        if _NOT_MODIFIED in e.message:
             logger.debug(f"Message markup not modified (content unchanged): {message.message_id}")
             return False
         else:
@@ -19,15 +19,19 @@ Supported formats:
 """
 
 import logging
-from typing import Dict, Optional
+import re
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 import urllib.parse
+from types import MappingProxyType
 
 
 logger = logging.getLogger(__name__)
 
 
-# Mapping of short codes to full values for compactness
-UTM_SHORTCUTS = {
+# Mapping of short codes to full values for compactness (read-only)
+UTM_SHORTCUTS = MappingProxyType({
     # Sources
     'yd': 'yandex_direct',
     'rsya': 'yandex_rsya',
@@ -46,7 +50,25 @@ UTM_SHORTCUTS = {
     'referral': 'referral',
     'social': 'social',
     'banner': 'banner',
-}
+})
+
+# Shortcuts must be one-to-one, otherwise generated links wouldn't parse back
+assert len(set(UTM_SHORTCUTS.values())) == len(UTM_SHORTCUTS), "UTM_SHORTCUTS values must be unique"
+
+# Full value -> short code, used when generating links
+_UTM_REVERSE_SHORTCUTS = MappingProxyType({v: k for k, v in UTM_SHORTCUTS.items()})
+
+# Order of values returned by _parse_utm_cached
+_UTM_FIELDS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_content', 'utm_term')
+
+# Template for parse results; copied, never mutated
+_EMPTY_UTM = dict.fromkeys(_UTM_FIELDS)
+
+# Keys accepted in full-format parameters
+_UTM_VALID = frozenset(_UTM_FIELDS)
+
+# Values made only of characters urllib.parse.quote never escapes
+_URL_SAFE_RE = re.compile(r'[A-Za-z0-9._~-]*\Z')
 
 
 def parse_utm_from_start_param(param: Optional[str]) -> Dict[str, Optional[str]]:
@@ -78,52 +100,95 @@ def parse_utm_from_start_param(param: Optional[str]) -> Dict[str, Optional[str]]
         {'utm_source': None, 'utm_medium': None,
          'utm_campaign': None, 'utm_content': None, 'utm_term': None}
     """
-    result = {
-        'utm_source': None,
-        'utm_medium': None,
-        'utm_campaign': None,
-        'utm_content': None,
-        'utm_term': None
-    }
+    result = _EMPTY_UTM.copy()
 
     if not param:
         return result
 
     try:
-        # Try full UTM format first (utm_source-value_utm_medium-value)
-        if 'utm_' in param:
-            result.update(_parse_full_utm_format(param))
-        else:
-            # Use short format (source_medium_campaign_content_term)
-            result.update(_parse_short_utm_format(param))
+        result.update(zip(_UTM_FIELDS, _parse_utm_cached(param)))
 
-        logger.info(f"Parsed UTM from param '{param}': {result}")
+        logger.info("Parsed UTM from param '%s': %s", param, result)
 
     except Exception as e:
-        logger.error(f"Error parsing UTM from param '{param}': {e}", exc_info=True)
+        logger.error("Error parsing UTM from param '%s': %s", param, e, exc_info=True)
 
     return result
 
 
-def _parse_short_utm_format(param: str) -> Dict[str, Optional[str]]:
+def parse_utm_batch(params: Iterable[Optional[str]]) -> List[Dict[str, Optional[str]]]:
     """
-    Parse short UTM format: source_medium_campaign_content_term
+    Parse UTM parameters for many /start parameters (analytics backfills).
+
+    Each distinct parameter is parsed once and the result fanned out to every
+    occurrence. Unlike parse_utm_from_start_param, this doesn't log every item
+    or fill the live lru_cache with historical parameters.
 
     Args:
-        param: Short format parameter (e.g., "yd_cpc_sellers_banner1_keyword")
+        params: /start parameters, None or empty allowed
 
     Returns:
-        Dict with parsed UTM parameters
+        List of UTM dicts in the same order as params
     """
-    result = {
-        'utm_source': None,
-        'utm_medium': None,
-        'utm_campaign': None,
-        'utm_content': None,
-        'utm_term': None
-    }
+    parsed: Dict[Optional[str], Tuple[Optional[str], ...]] = {}
+    results = []
+
+    for param in params:
+        values = parsed.get(param)
+        if values is None:
+            values = (None,) * len(_UTM_FIELDS)
+            if param:
+                try:
+                    values = _parse_utm_values(param)
+                except Exception as e:
+                    logger.error("Error parsing UTM from param '%s': %s", param, e)
+            parsed[param] = values
+
+        results.append(dict(zip(_UTM_FIELDS, values)))
+
+    return results
+
+
+@lru_cache(maxsize=1024)
+def _parse_utm_cached(param: str) -> Tuple[Optional[str], ...]:
+    """
+    Memoized _parse_utm_values.
+
+    Campaign links send many users through the same few parameters. A tuple
+    is returned so the cached value can't be mutated;
+    parse_utm_from_start_param builds a fresh dict from it for every caller.
+    """
+    return _parse_utm_values(param)
+
+
+def _parse_utm_values(param: str) -> Tuple[Optional[str], ...]:
+    """Parse a non-empty /start parameter into UTM values ordered as _UTM_FIELDS."""
+    # Full UTM format always starts with a utm_ key (utm_source-value_utm_medium-value)
+    parsed = _EMPTY_UTM.copy()
+    if param.startswith('utm_'):
+        _parse_full_utm_format(param, parsed)
+    else:
+        # Use short format (source_medium_campaign_content_term)
+        _parse_short_utm_format(param, parsed)
+
+    # Values repeat across campaigns (sources, mediums); intern them so
+    # results from different params share string objects
+    return tuple(
+        value if value is None else sys.intern(value)
+        for value in map(parsed.__getitem__, _UTM_FIELDS)
+    )
 
-    parts = param.split('_')
+
+def _parse_short_utm_format(param: str, result: Dict[str, Optional[str]]) -> None:
+    """
+    Parse short UTM format: source_medium_campaign_content_term
+
+    Args:
+        param: Short format parameter (e.g., "yd_cpc_sellers_banner1_keyword")
+        result: UTM dict to fill in place
+    """
+    # At most 5 fields; the term keeps any remaining underscores
+    parts = param.split('_', 4)
 
     if len(parts) >= 1:
         # Source
@@ -144,33 +209,19 @@ def _parse_short_utm_format(param: str) -> Dict[str, Optional[str]]:
         result['utm_content'] = parts[3]
 
     if len(parts) >= 5:
-        # Term (join remaining parts with underscore)
-        result['utm_term'] = '_'.join(parts[4:])
+        # Term
+        result['utm_term'] = parts[4]
 
-    return result
 
-
-def _parse_full_utm_format(param: str) -> Dict[str, Optional[str]]:
+def _parse_full_utm_format(param: str, result: Dict[str, Optional[str]]) -> None:
     """
     Parse full UTM format: utm_source-value_utm_medium-value_...
 
     Args:
         param: Full format parameter (e.g., "utm_source-yandex_utm_medium-cpc")
-
-    Returns:
-        Dict with parsed UTM parameters
+        result: UTM dict to fill in place
     """
-    result = {
-        'utm_source': None,
-        'utm_medium': None,
-        'utm_campaign': None,
-        'utm_content': None,
-        'utm_term': None
-    }
-
     # Use regex to split by _utm_ pattern while preserving the utm_ prefix
-    import re
-
     # Split by _utm_ but keep utm_ prefix for next match
     # Example: "utm_source-yandex_utm_medium-cpc" -> ["utm_source-yandex", "utm_medium-cpc"]
     parts = re.split(r'_(?=utm_)', param)
@@ -182,21 +233,9 @@ def _parse_full_utm_format(param: str) -> Dict[str, Optional[str]]:
         # Split key-value by first dash
         key, value = part.split('-', 1)
 
-        # URL decode value
-        value = urllib.parse.unquote(value)
-
-        if key == 'utm_source':
-            result['utm_source'] = value
-        elif key == 'utm_medium':
-            result['utm_medium'] = value
-        elif key == 'utm_campaign':
-            result['utm_campaign'] = value
-        elif key == 'utm_content':
-            result['utm_content'] = value
-        elif key == 'utm_term':
-            result['utm_term'] = value
-
-    return result
+        if key in _UTM_VALID:
+            # URL decode value (only needed when it has escapes)
+            result[key] = urllib.parse.unquote(value) if '%' in value else value
 
 
 def generate_utm_link(
@@ -250,31 +289,27 @@ def _generate_short_utm_param(
     term: Optional[str] = None
 ) -> str:
     """Generate short format UTM parameter."""
-    # Reverse lookup for shortcuts
-    reverse_shortcuts = {v: k for k, v in UTM_SHORTCUTS.items()}
-
-    parts = []
-
-    # Add source (use shortcut if available)
-    parts.append(reverse_shortcuts.get(source, source))
-
-    # Add medium
-    if medium:
-        parts.append(reverse_shortcuts.get(medium, medium))
+    fields = (source, medium, campaign, content, term)
 
-        # Add campaign only if medium exists
-        if campaign:
-            parts.append(campaign)
+    # Positional format: each optional field is kept only if all fields
+    # before it are set, so stop at the first missing one
+    count = 1
+    while count < 5 and fields[count]:
+        count += 1
 
-            # Add content only if campaign exists
-            if content:
-                parts.append(content)
+    # Source and medium use shortcuts if available
+    if count == 1:
+        return _UTM_REVERSE_SHORTCUTS.get(source, source)
+    return '_'.join((
+        _UTM_REVERSE_SHORTCUTS.get(source, source),
+        _UTM_REVERSE_SHORTCUTS.get(medium, medium),
+        *fields[2:count]
+    ))
 
-                # Add term only if content exists
-                if term:
-                    parts.append(term)
 
-    return '_'.join(parts)
+def _quote(value: str) -> str:
+    """URL-quote value, skipping urllib for already URL-safe strings."""
+    return value if _URL_SAFE_RE.match(value) else urllib.parse.quote(value)
 
 
 def _generate_full_utm_param(
@@ -288,14 +323,14 @@ def _generate_full_utm_param(
     pairs = []
 
     if source:
-        pairs.append(f"utm_source-{urllib.parse.quote(source)}")
+        pairs.append(f"utm_source-{_quote(source)}")
     if medium:
-        pairs.append(f"utm_medium-{urllib.parse.quote(medium)}")
+        pairs.append(f"utm_medium-{_quote(medium)}")
     if campaign:
-        pairs.append(f"utm_campaign-{urllib.parse.quote(campaign)}")
+        pairs.append(f"utm_campaign-{_quote(campaign)}")
     if content:
-        pairs.append(f"utm_content-{urllib.parse.quote(content)}")
+        pairs.append(f"utm_content-{_quote(content)}")
     if term:
-        pairs.append(f"utm_term-{urllib.parse.quote(term)}")
+        pairs.append(f"utm_term-{_quote(term)}")
 
     return '_'.join(pairs)
@@ -1,6 +1,13 @@
-from typing import Optional
+from typing import Collection, Optional
 import re
 
+# Patterns compiled once at import
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+# Separators allowed in invoice IDs, deleted before the alphanumeric check
+_INVOICE_STRIP = str.maketrans('', '', '-_')
+
 
 def validate_email(email: str) -> bool:
     """
@@ -12,8 +19,35 @@ def validate_email(email: str) -> bool:
     Returns:
         True if valid
     """
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    # Cheap rejects before the regex; 254 is the RFC 5321 address limit
+    # and also bounds regex backtracking on hostile input
+    if not email or len(email) < 6 or len(email) > 254 or '@' not in email:
+        return False
+
+    return _EMAIL_RE.match(email) is not None
+
+
+def _digits_only(phone: str) -> str:
+    """Remove all non-digit characters from phone"""
+    return ''.join(filter(str.isdecimal, phone))
+
+
+def _normalize_digits(digits: str) -> Optional[str]:
+    """
+    Convert a digits-only Russian phone number to +7XXXXXXXXXX
+
+    Returns:
+        Normalized number, or None if digits is not a valid Russian number
+    """
+    # 10 digits (without country code)
+    if len(digits) == 10:
+        return '+7' + digits
+
+    # 11 digits starting with 7 or 8 (8 is the domestic prefix for +7)
+    if len(digits) == 11 and digits[0] in '78':
+        return '+7' + digits[1:]
+
+    return None
 
 
 def validate_phone(phone: str) -> bool:
@@ -26,19 +60,7 @@ def validate_phone(phone: str) -> bool:
     Returns:
         True if valid
     """
-    # Remove all non-digit characters
-    digits = re.sub(r'\D', '', phone)
-
-    # Check if it's a valid Russian phone number
-    # Should be 11 digits starting with 7 or 8
-    if len(digits) == 11 and digits[0] in ['7', '8']:
-        return True
-
-    # Or 10 digits (without country code)
-    if len(digits) == 10:
-        return True
-
-    return False
+    return _normalize_digits(_digits_only(phone)) is not None
 
 
 def validate_telegram_id(telegram_id: int) -> bool:
@@ -67,6 +89,10 @@ def validate_amount(amount: float, min_amount: float = 0.01, max_amount: float =
     Returns:
         True if valid
     """
+    # Numbers need no conversion (bool goes through float() as before)
+    if type(amount) in (int, float):
+        return min_amount <= amount <= max_amount
+
     try:
         amount_float = float(amount)
         return min_amount <= amount_float <= max_amount
@@ -85,7 +111,7 @@ def validate_invoice_id(invoice_id: str) -> bool:
         True if valid
     """
     # Invoice ID should be alphanumeric and not empty
-    return bool(invoice_id) and invoice_id.replace('-', '').replace('_', '').isalnum()
+    return bool(invoice_id) and invoice_id.translate(_INVOICE_STRIP).isalnum()
 
 
 def validate_image_file(file_size: int, max_size: int = 20 * 1024 * 1024) -> tuple[bool, Optional[str]]:
@@ -123,26 +149,25 @@ def sanitize_text(text: str, max_length: int = 1000) -> str:
     if not text:
         return ""
 
-    # Remove leading/trailing whitespace
-    text = text.strip()
+    # Remove leading/trailing whitespace and potential HTML/script tags
+    # (basic sanitization) in one regex pass
+    text = _HTML_TAG_RE.sub('', text.strip())
 
-    # Truncate if too long
+    # Truncate if too long (after tag removal, so no tag is cut in half)
     if len(text) > max_length:
         text = text[:max_length]
 
-    # Remove potential HTML/script tags (basic sanitization)
-    text = re.sub(r'<[^>]+>', '', text)
-
     return text
 
 
-def validate_package_id(package_id: int, available_packages: list) -> bool:
+def validate_package_id(package_id: int, available_packages: Collection[int]) -> bool:
     """
     Validate package ID against available packages
 
     Args:
         package_id: Package ID to validate
-        available_packages: List of available package IDs
+        available_packages: Available package IDs; pass a set/frozenset built
+            once by the caller for O(1) membership (a list is scanned linearly)
 
     Returns:
         True if valid
@@ -160,20 +185,18 @@ def normalize_phone_number(phone: str) -> str:
     Returns:
         Normalized phone number starting with +7 (or original if invalid)
     """
-    # Remove all non-digit characters
-    digits = re.sub(r'\D', '', phone)
+    # Return original if can't normalize
+    return _normalize_digits(_digits_only(phone)) or phone
 
-    # Convert 8 to 7 for Russian numbers
-    if digits.startswith('8') and len(digits) == 11:
-        digits = '7' + digits[1:]
 
-    # Add +7 prefix if missing
-    if len(digits) == 10:
-        digits = '7' + digits
+def validate_and_normalize(phone: str) -> Optional[str]:
+    """
+    Validate and normalize phone number with a single digit-extraction pass
 
-    # Add + prefix
-    if digits.startswith('7') and len(digits) == 11:
-        return '+' + digits
+    Args:
+        phone: Phone number in any format
 
-    # Return original if can't normalize
-    return phone
+    Returns:
+        Normalized phone number starting with +7, or None if invalid
+    """
+    return _normalize_digits(_digits_only(phone))
@@ -9,14 +9,15 @@ from app.config import settings
 from app.handlers import get_routers
 from app.database import init_db
 from app.middlewares import DbSessionMiddleware
+from app.utils.logging_config import setup_queue_logging
 
-# Configure detailed logging with proper formatting
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout,
-    force=True  # Force reconfiguration of root logger
-)
+# Resolve configured log level once (falls back to INFO for unknown names)
+_LOG_LEVEL = getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO)
+_BANNER = "=" * 60
+
+# Configure detailed logging with proper formatting; stdout writes happen
+# on a background listener thread so logging never blocks the event loop
+setup_queue_logging(level=_LOG_LEVEL)
 
 # Set up logger for this module
 logger = logging.getLogger(__name__)
@@ -31,11 +32,10 @@ sys.stdout.reconfigure(line_buffering=True)
 async def main():
     """Main entry point"""
     try:
-        logger.info("="*60)
-        logger.info("Starting Product Photoshoot Bot...")
-        logger.info(f"Log level: {settings.LOG_LEVEL}")
-        logger.info(f"Bot username: {settings.BOT_USERNAME}")
-        logger.info("="*60)
+        logger.info(
+            "%s\nStarting Product Photoshoot Bot...\nLog level: %s\nBot username: %s\n%s",
+            _BANNER, settings.LOG_LEVEL, settings.BOT_USERNAME, _BANNER
+        )
         
         # Initialize Bot and Dispatcher
         logger.info("Initializing bot and dispatcher...")
@@ -73,10 +73,10 @@ async def main():
         logger.info(f"Bot info: @{bot_info.username} (ID: {bot_info.id})")
         
         # Start polling
-        logger.info("="*60)
-        logger.info("🚀 Bot is now running and polling for updates...")
-        logger.info("Press Ctrl+C to stop")
-        logger.info("="*60)
+        logger.info(
+            "%s\n🚀 Bot is now running and polling for updates...\nPress Ctrl+C to stop\n%s",
+            _BANNER, _BANNER
+        )
         
         await dp.start_polling(
             bot,
@@ -88,12 +88,17 @@ async def main():
         raise
 
 if __name__ == "__main__":
+    # Use libuv-based event loop where available (not supported on Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        logger.info("uvloop not installed, using default asyncio event loop")
+
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
-        logger.info("="*60)
-        logger.info("Bot stopped by user")
-        logger.info("="*60)
+        logger.info("%s\nBot stopped by user\n%s", _BANNER, _BANNER)
     except Exception as e:
         logger.critical(f"Unhandled exception: {e}", exc_info=True)
         sys.exit(1)